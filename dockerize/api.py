@@ -1,10 +1,14 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Header, Response
 from pydantic import BaseModel
 from typing import List, Optional
-from sqlalchemy import create_engine, Column, BigInteger, String, Enum, Numeric, ForeignKey
-from sqlalchemy.orm import sessionmaker, declarative_base, Session, relationship
+from sqlalchemy import select, text, bindparam, Column, BigInteger, String, Numeric, ForeignKey
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import declarative_base
 import enum
 import os
+import time
+import secrets
+import orjson
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -14,17 +18,32 @@ DATABASE = os.getenv("DATABASE")
 USER = os.getenv("USER")
 PASSWORD = os.getenv("PASSWORD")
 PORT = os.getenv("PORT")
+CATALOG_CACHE_TTL = int(os.getenv("CATALOG_CACHE_TTL", "300"))  # seconds
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")  # unset disables /admin endpoints
 
 # ---------------------------------------------------------------------------
 # Database Setup
 # ---------------------------------------------------------------------------
-DATABASE_URL = f"postgresql://{USER}:{PASSWORD}@{HOST}:{PORT}/{DATABASE}"
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+DATABASE_URL = f"postgresql+asyncpg://{USER}:{PASSWORD}@{HOST}:{PORT}/{DATABASE}"
+engine = create_async_engine(
+    DATABASE_URL,
+    pool_size=20,
+    max_overflow=40,
+    pool_pre_ping=True,   # drop connections killed while idle
+    pool_recycle=300,
+    connect_args={
+        "server_settings": {
+            "jit": "off",   # JIT compile costs more than these short queries
+            "application_name": "fundamental-api",
+        },
+    },
+)
+SessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 # ---------------------------------------------------------------------------
-# ENUMS matching PostgreSQL
+# ENUMS matching the PostgreSQL CHECK constraints (columns are plain strings;
+# these validate query parameters and document the response schema)
 # ---------------------------------------------------------------------------
 class FinancialStatementType(str, enum.Enum):
     per_share_data_array = "per_share_data_array"
@@ -47,7 +66,7 @@ class FundamentalDataType(Base):
     __tablename__ = "fundamental_data_type"
 
     id = Column(BigInteger, primary_key=True, index=True)
-    type = Column(Enum(FinancialStatementType), nullable=False)
+    type = Column(String(30), nullable=False)
     name = Column(String(50), nullable=False)
 
 class FundamentalData(Base):
@@ -55,14 +74,15 @@ class FundamentalData(Base):
 
     id = Column(BigInteger, primary_key=True, index=True)
     ticker = Column(String(30), nullable=False)
-    period = Column(Enum(PeriodType), nullable=False)
+    period = Column(String(10), nullable=False)
     year = Column(String(5), nullable=False)
     month = Column(String(3), nullable=False)
     fundamental_data_type_id = Column(BigInteger, ForeignKey("fundamental_data_type.id", ondelete="CASCADE"), nullable=False)
+    # Denormalized from fundamental_data_type
+    type = Column(String(30), nullable=False)
+    metric_name = Column(String(50), nullable=False)
     value = Column(Numeric, nullable=False)
 
-    data_type = relationship("FundamentalDataType")
-
 # ---------------------------------------------------------------------------
 # Pydantic Schemas
 # ---------------------------------------------------------------------------
@@ -87,6 +107,57 @@ class FundamentalDataSchema(BaseModel):
     class Config:
         orm_mode = True
 
+# ---------------------------------------------------------------------------
+# Prebuilt queries
+# ---------------------------------------------------------------------------
+# Optional filters of /fundamental-data/{ticker}: (query param, column)
+TICKER_DATA_FILTERS = (
+    ("period", FundamentalData.period),
+    ("year", FundamentalData.year),
+    ("month", FundamentalData.month),
+    ("statement_type", FundamentalData.type),
+    ("name", FundamentalData.metric_name),
+)
+
+def build_ticker_data_query(mask):
+    # Read-only response: select plain columns and build the response dicts
+    # directly instead of hydrating FundamentalData objects. The data type
+    # fields are denormalized onto fundamental_data, so no join is needed.
+    stmt = (
+        select(
+            FundamentalData.id,
+            FundamentalData.period,
+            FundamentalData.year,
+            FundamentalData.month,
+            FundamentalData.fundamental_data_type_id,
+            FundamentalData.value,
+            FundamentalData.type,
+            FundamentalData.metric_name,
+        )
+        .where(FundamentalData.ticker == bindparam("ticker"))
+        # Matches idx_fundamental_data_ticker_period_year_month, so a
+        # backward index scan returns rows already sorted.
+        .order_by(
+            FundamentalData.period.desc(),
+            FundamentalData.year.desc(),
+            FundamentalData.month.desc(),
+        )
+    )
+
+    for bit, (param, column) in enumerate(TICKER_DATA_FILTERS):
+        if mask & (1 << bit):
+            stmt = stmt.where(column == bindparam(param))
+
+    return stmt.execution_options(yield_per=1000)
+
+# One statement per combination of filters, indexed by the bitmask of the
+# filters that are set. Reusing the same statement objects keeps both the
+# SQLAlchemy compiled cache and asyncpg's prepared statement cache warm.
+TICKER_DATA_QUERIES = [
+    build_ticker_data_query(mask)
+    for mask in range(1 << len(TICKER_DATA_FILTERS))
+]
+
 # ---------------------------------------------------------------------------
 # FastAPI app
 # ---------------------------------------------------------------------------
@@ -94,12 +165,35 @@ app = FastAPI()
 
 # Dependency
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+# ---------------------------------------------------------------------------
+# Catalog cache
+# ---------------------------------------------------------------------------
+# Slow-changing catalog endpoints keep their serialized body in-process:
+# key -> (loaded_at, JSON bytes). Starts empty on every process start.
+catalog_cache = {}
+
+async def cached_catalog_response(key, load, db):
+    cached = catalog_cache.get(key)
+
+    if cached is None or time.monotonic() - cached[0] >= CATALOG_CACHE_TTL:
+        cached = (time.monotonic(), orjson.dumps(await load(db)))
+        catalog_cache[key] = cached
+
+    return Response(content=cached[1], media_type="application/json")
+
+async def load_fundamental_data_types(db):
+    rows = await db.execute(
+        select(FundamentalDataType.id, FundamentalDataType.type, FundamentalDataType.name)
+    )
+    return [{"id": type_id, "type": type_, "name": name} for type_id, type_, name in rows]
+
+async def load_tickers(db):
+    tickers = await db.execute(select(FundamentalData.ticker).distinct())
+    return tickers.scalars().all()
 
 # ---------------------------------------------------------------------------
 # API Endpoints
@@ -107,87 +201,108 @@ def get_db():
 
 # Fetch all fundamental data types
 @app.get("/fundamental-data-types", response_model=List[FundamentalDataTypeSchema])
-def get_fundamental_data_types(db: Session = Depends(get_db)):
-    return db.query(FundamentalDataType).all()
+async def get_fundamental_data_types(db: AsyncSession = Depends(get_db)):
+    return await cached_catalog_response("fundamental-data-types", load_fundamental_data_types, db)
 
 # Fetch fundamental data by ticker
 @app.get("/fundamental-data/{ticker}", response_model=List[FundamentalDataSchema])
-def get_data_by_ticker(
+async def get_data_by_ticker(
     ticker: str,
     period: Optional[PeriodType] = None,
     year: Optional[str] = None,
     month: Optional[str] = None,
     statement_type: Optional[FinancialStatementType] = None,  # ENUM type filter
     name: Optional[str] = None,  # data type name filter
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    query = (
-        db.query(FundamentalData)
-        .join(FundamentalDataType)
-        .filter(FundamentalData.ticker == ticker)
-    )
-
-    if period:
-        query = query.filter(FundamentalData.period == period)
-
-    if year:
-        query = query.filter(FundamentalData.year == year)
-
-    if month:
-        query = query.filter(FundamentalData.month == month)
-
-    if statement_type:
-        query = query.filter(FundamentalDataType.type == statement_type)
-
-    if name:
-        query = query.filter(FundamentalDataType.name == name)
-
-    result = query.all()
+    filters = {
+        "period": period,
+        "year": year,
+        "month": month,
+        "statement_type": statement_type,
+        "name": name,
+    }
+    params = {"ticker": ticker}
+    mask = 0
+
+    for bit, (param, _) in enumerate(TICKER_DATA_FILTERS):
+        if filters[param]:
+            mask |= 1 << bit
+            params[param] = filters[param]
+
+    rows = await db.stream(TICKER_DATA_QUERIES[mask], params)
+
+    result = [
+        {
+            "id": row_id,
+            "ticker": ticker,
+            "period": row_period,
+            "year": row_year,
+            "month": row_month,
+            "fundamental_data_type_id": type_id,
+            "value": float(value),
+            "data_type": {"id": type_id, "type": type_, "name": type_name},
+        }
+        async for row_id, row_period, row_year, row_month, type_id, value, type_, type_name in rows
+    ]
 
     if not result:
         raise HTTPException(status_code=404, detail="No data found for this ticker")
 
-    return result
+    # Returning an orjson-encoded Response skips response_model validation
+    # and jsonable_encoder; response_model is kept for the OpenAPI schema.
+    return Response(content=orjson.dumps(result), media_type="application/json")
 
 
 # Fetch all unique tickers
 @app.get("/tickers", response_model=List[str])
-def get_all_tickers(db: Session = Depends(get_db)):
-    tickers = db.query(FundamentalData.ticker).distinct().all()
-    return [t[0] for t in tickers]
+async def get_all_tickers(db: AsyncSession = Depends(get_db)):
+    return await cached_catalog_response("tickers", load_tickers, db)
+
+# Drop cached catalog responses, e.g. after an import.
+# Requires the X-Admin-Token header to match ADMIN_TOKEN.
+@app.post("/admin/cache/invalidate", status_code=204)
+async def invalidate_catalog_cache(x_admin_token: Optional[str] = Header(None)):
+    # Compare bytes: compare_digest rejects non-ASCII str with TypeError
+    if (
+        not ADMIN_TOKEN
+        or not x_admin_token
+        or not secrets.compare_digest(x_admin_token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8"))
+    ):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    catalog_cache.clear()
+    return Response(status_code=204)
+
+# Builds {period: [{"year": ..., "month": ...}, ...]} in Postgres so the
+# handler can pass the JSON text straight through.
+TICKER_AVAILABILITY_SQL = text("""
+    SELECT json_object_agg(period, dates)::text
+    FROM (
+        SELECT
+            period,
+            json_agg(
+                json_build_object('year', year, 'month', month)
+                ORDER BY year DESC, month DESC
+            ) AS dates
+        FROM (
+            SELECT DISTINCT period, year, month
+            FROM fundamental_data
+            WHERE ticker = :ticker
+        ) AS periods
+        GROUP BY period
+    ) AS availability
+""")
 
 @app.get("/ticker/{ticker}/availability")
-def get_ticker_availability(ticker: str, db: Session = Depends(get_db)):
-    rows = (
-        db.query(FundamentalData.period, FundamentalData.year, FundamentalData.month)
-        .filter(FundamentalData.ticker == ticker)
-        .distinct()  # ensure unique combinations
-        .all()
-    )
+async def get_ticker_availability(ticker: str, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(TICKER_AVAILABILITY_SQL, {"ticker": ticker})
+    availability = result.scalar()
 
-    if not rows:
+    if availability is None:
         raise HTTPException(status_code=404, detail="No data found for this ticker")
 
-    availability = {}
-    unique_set = set()  # to ensure uniqueness at Python level too
-
-    for period, year, month in rows:
-        key = (period, year, month)
-
-        if key in unique_set:
-            continue
-
-        unique_set.add(key)
-
-        if period not in availability:
-            availability[period] = []
-
-        availability[period].append({
-            "year": year,
-            "month": month
-        })
-
-    return availability
+    return Response(content=availability, media_type="application/json")
 
 
 # ---------------------------------------------------------------------------
@@ -1,28 +1,27 @@
 import os
-import json
+import io
+import re
+import sys
+import mmap
+import struct
+import simdjson
 import psycopg2
-from psycopg2.extras import execute_values
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from dotenv import load_dotenv
 
 load_dotenv()
 
 DATA_FOLDER = "fundamentals_data/nse"
+BATCH_SIZE = 500000  # rows per COPY batch
+# Files parsed or being parsed ahead of the writer; bounds parent memory
+MAX_PENDING_FILES = (os.cpu_count() or 1) * 4
 HOST = os.getenv("HOST")
 DATABASE = os.getenv("DATABASE")
 USER = os.getenv("USER")
 PASSWORD = os.getenv("PASSWORD")
 
-# -----------------------------------------------
-# Postgres Connection
-# -----------------------------------------------
-conn = psycopg2.connect(
-    host=HOST,
-    database=DATABASE,
-    user=USER,
-    password=PASSWORD
-)
-cursor = conn.cursor()
-
 FINANCIAL_BLOCKS = [
     "per_share_data_array",
     "common_size_ratios",
@@ -35,99 +34,61 @@ FINANCIAL_BLOCKS = [
 
 
 # ---------------------------------------------------------
-# 1. Extract all unique metric names first (2-pass process)
+# Value / fiscal year parsing (used inline in process_file)
 # ---------------------------------------------------------
-def scan_all_metric_names():
-    metrics = {block: set() for block in FINANCIAL_BLOCKS}
-
-    for filename in os.listdir(DATA_FOLDER):
-        if not filename.endswith(".json"):
-            continue
-
-        path = os.path.join(DATA_FOLDER, filename)
-        with open(path, "r") as f:
-            data = json.load(f)
-
-        if "financials" not in data:
-            continue
-
-        financials = data["financials"]
-
-        for period_type in ["annuals", "quarterly"]:
-            if period_type not in financials:
-                continue
+BAD_VALUES = frozenset({"N/A", "-", "", None})
+FISCAL_YEAR_MATCH = re.compile(r"^(\d{4})-(\d{2})").match
 
-            period_block = financials[period_type]
-
-            for block_name in FINANCIAL_BLOCKS:
-                if block_name in period_block:
-                    block_data = period_block[block_name]
-                    for metric_key in block_data.keys():
-                        metrics[block_name].add(metric_key)
-
-    return metrics
+# One reusable parser per process (each pool worker gets its own copy).
+# Its documents are only valid until the next parse() call.
+json_parser = simdjson.Parser()
 
 
 # ---------------------------------------------------------
-# 2. Insert metric rows into fundamental_data_type
+# Input files
 # ---------------------------------------------------------
-def create_fundamental_data_type_rows(metrics):
-    """
-    Insert if missing. Return mapping:
-    mapping[block_name][metric_name] = id
-    """
-    cursor.execute("SELECT type, name, id FROM fundamental_data_type;")
-    existing = {(row[0], row[1]): row[2] for row in cursor.fetchall()}
+def iter_data_files():
+    """Yield the path of every .json file in DATA_FOLDER."""
+    with os.scandir(DATA_FOLDER) as entries:
+        for entry in entries:
+            if entry.name.endswith(".json") and entry.is_file(follow_symlinks=False):
+                yield entry.path
 
-    mapping = {block: {} for block in FINANCIAL_BLOCKS}
-
-    for block, metric_names in metrics.items():
-        for metric in metric_names:
-
-            if (block, metric) in existing:
-                mapping[block][metric] = existing[(block, metric)]
-                continue
-
-            cursor.execute(
-                "INSERT INTO fundamental_data_type (type, name) VALUES (%s, %s) RETURNING id;",
-                (block, metric)
-            )
-            mapping[block][metric] = cursor.fetchone()[0]
-
-    conn.commit()
-    return mapping
 
+def parse_files(executor, filepaths):
+    """
+    Yield process_file results in order while keeping at most
+    MAX_PENDING_FILES submitted, so parsed rows cannot pile up in this
+    process faster than the writer consumes them.
+    """
+    pending = deque()
 
-# ---------------------------------------------------------
-# Helpers
-# ---------------------------------------------------------
-def valid_number(v):
-    if v in ["N/A", "-", "", None]:
-        return None
-    try:
-        return float(v)
-    except:
-        return None
+    for filepath in filepaths:
+        pending.append(executor.submit(process_file, filepath))
+        if len(pending) >= MAX_PENDING_FILES:
+            yield pending.popleft().result()
 
-def extract_year_month(fy):
-    if fy is None or fy == "" or fy == "TTM" or "-" not in fy:
-        return None, None
-    year, month = fy.split("-")[:2]
-    return year, month
+    while pending:
+        yield pending.popleft().result()
 
 
 # ---------------------------------------------------------
-# 3. Convert each file into rows referencing correct metric ID
+# 1. Convert each file into rows keyed by (block, metric name)
 # ---------------------------------------------------------
-def process_file(filepath, mapping):
-    rows = []
-    ticker = os.path.basename(filepath).replace(".json", "")
+def process_file(filepath):
+    """
+    Return (ticker, columns): the ticker once, plus parallel lists
+    (period, year, month, type, name, value) with one entry per row.
+    """
+    ticker = sys.intern(os.path.basename(filepath).replace(".json", ""))
+    columns = ([], [], [], [], [], [])
+    periods, years, months, block_names, metric_names, values = columns
 
-    with open(filepath, "r") as f:
-        data = json.load(f)
+    with open(filepath, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        data = json_parser.parse(mm)
 
     if "financials" not in data:
-        return rows
+        return ticker, columns
 
     financials = data["financials"]
 
@@ -136,7 +97,18 @@ def process_file(filepath, mapping):
             continue
 
         period_block = financials[period_type]
-        fiscal_years = period_block.get("Fiscal Year", [])
+
+        # Parse the fiscal year column once per block: (year, month) for
+        # each column index, or None for TTM / malformed entries.
+        fiscal_periods = [
+            match.groups() if match else None
+            for match in (
+                FISCAL_YEAR_MATCH(fy) if fy else None
+                for fy in period_block.get("Fiscal Year", [])
+            )
+        ]
+        if not any(fiscal_periods):
+            continue
 
         for block_name in FINANCIAL_BLOCKS:
             if block_name not in period_block:
@@ -145,77 +117,236 @@ def process_file(filepath, mapping):
             block_data = period_block[block_name]
 
             for metric_name, values_list in block_data.items():
-                metric_id = mapping[block_name].get(metric_name)
-
-                for idx, raw_value in enumerate(values_list):
-                    value = valid_number(raw_value)
-                    if value is None:
+                for fiscal_period, raw_value in zip(fiscal_periods, values_list):
+                    if fiscal_period is None:
                         continue
-
-                    fy = fiscal_years[idx]
-                    year, month = extract_year_month(fy)
-                    if not year:
+                    # Nested arrays/objects are unhashable: TypeError on the
+                    # BAD_VALUES lookup skips them like other bad cells.
+                    try:
+                        if raw_value in BAD_VALUES:
+                            continue
+                        value = float(raw_value)
+                    except (TypeError, ValueError):
                         continue
 
-                    rows.append((
-                        ticker,
-                        period_type,
-                        year,
-                        month,
-                        metric_id,
-                        value
-                    ))
+                    year, month = fiscal_period
+                    periods.append(period_type)
+                    years.append(year)
+                    months.append(month)
+                    block_names.append(block_name)
+                    metric_names.append(metric_name)
+                    values.append(value)
 
-    return rows
+    return ticker, columns
 
 
 # ---------------------------------------------------------
-# 4. Insert into fundamental_data
+# 2. Insert into fundamental_data_type + fundamental_data
 # ---------------------------------------------------------
-def insert_fundamental_data(rows):
-    if not rows:
+PGCOPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+PGCOPY_TRAILER = struct.pack(">h", -1)
+
+
+def encode_copy_binary(chunks):
+    """
+    Encode process_file results in the PostgreSQL binary COPY format:
+    (ticker, period, year, month, type, name) as UTF-8 text and the
+    value as float8.
+    """
+    buf = io.BytesIO()
+    write = buf.write
+    write(PGCOPY_HEADER)
+
+    for ticker, columns in chunks:
+        # Field count + ticker field are identical for every row of a file
+        ticker_data = ticker.encode("utf-8")
+        row_prefix = struct.pack(">hi", 7, len(ticker_data)) + ticker_data
+
+        for period, year, month, block_name, metric_name, value in zip(*columns):
+            write(row_prefix)
+            for text in (period, year, month, block_name, metric_name):
+                data = text.encode("utf-8")
+                write(struct.pack(">i", len(data)))
+                write(data)
+            write(struct.pack(">id", 8, value))
+
+    write(PGCOPY_TRAILER)
+    buf.seek(0)
+    return buf
+
+
+def insert_fundamental_data(cursor, chunks):
+    """
+    COPY rows (binary format) into a temp staging table, register any
+    metric names not yet in fundamental_data_type, then move the rows
+    into fundamental_data keeping the ON CONFLICT DO NOTHING semantics.
+    Runs inside the caller's transaction and does not commit.
+    """
+    if not chunks:
         return
 
-    sql = """
+    cursor.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS fundamental_data_stage (
+            ticker VARCHAR(30),
+            period VARCHAR(10),
+            year VARCHAR(5),
+            month VARCHAR(3),
+            type VARCHAR(30),
+            name VARCHAR(50),
+            value DOUBLE PRECISION
+        ) ON COMMIT DROP;
+    """)
+    cursor.copy_expert(
+        "COPY fundamental_data_stage FROM STDIN WITH (FORMAT BINARY);",
+        encode_copy_binary(chunks)
+    )
+    cursor.execute("""
+        INSERT INTO fundamental_data_type (type, name)
+        SELECT DISTINCT type, name
+        FROM fundamental_data_stage
+        ON CONFLICT ON CONSTRAINT fundamental_data_type_unique DO NOTHING;
+    """)
+    cursor.execute("""
         INSERT INTO fundamental_data
-            (ticker, period, year, month, fundamental_data_type_id, value)
-        VALUES %s
+            (ticker, period, year, month, fundamental_data_type_id,
+             type, metric_name, value)
+        SELECT s.ticker, s.period, s.year, s.month, t.id,
+               s.type, s.name, s.value
+        FROM fundamental_data_stage s
+        JOIN fundamental_data_type t
+            ON t.type = s.type AND t.name = s.name
         ON CONFLICT ON CONSTRAINT fundamental_data_unique DO NOTHING;
-    """
-    execute_values(cursor, sql, rows)
-    conn.commit()
+    """)
+    cursor.execute("TRUNCATE fundamental_data_stage;")
 
 
 # ---------------------------------------------------------
-# MAIN EXECUTION
+# 3. Defer secondary index maintenance during the import
 # ---------------------------------------------------------
-def main():
+# Secondary indexes of fundamental_data, read from the catalog so
+# table_create.sql stays the only place they are defined. Indexes
+# backing constraints (primary key, fundamental_data_unique) are kept:
+# ON CONFLICT needs the unique one.
+SECONDARY_INDEXES_SQL = """
+    SELECT format('%I.%I', schemaname, indexname), indexdef
+    FROM pg_indexes
+    WHERE schemaname = current_schema()
+      AND tablename = 'fundamental_data'
+      AND indexname NOT IN (
+          SELECT conname
+          FROM pg_constraint
+          WHERE conrelid = 'fundamental_data'::regclass
+      );
+"""
+
+
+@contextmanager
+def deferred_secondary_indexes(conn, cursor):
+    """
+    Drop the secondary indexes for the duration of the block and rebuild
+    them afterwards, so the load does not pay per-row index updates.
+    Rebuilding in one pass uses a sorted bulk build instead.
+    """
+    cursor.execute(SECONDARY_INDEXES_SQL)
+    indexes = cursor.fetchall()
 
-    # -------- PASS 1: scan all files for metric names ------
-    print("Scanning metrics...")
-    metrics = scan_all_metric_names()
+    for index_name, _ in indexes:
+        cursor.execute(f"DROP INDEX IF EXISTS {index_name};")
+    conn.commit()
 
-    # -------- PASS 2: create all fundamental_data_type rows ------
-    print("Creating metric type rows...")
-    mapping = create_fundamental_data_type_rows(metrics)
+    load_failed = False
+    try:
+        yield
+    except Exception:
+        load_failed = True
+        if conn.closed == 0:
+            conn.rollback()
+        raise
+    finally:
+        rebuild_secondary_indexes(conn, cursor, indexes, load_failed)
 
-    # -------- PASS 3: parse + insert all data ------
-    print("Importing data...")
-    batch = []
 
-    for filename in os.listdir(DATA_FOLDER):
-        if not filename.endswith(".json"):
-            continue
+def rebuild_secondary_indexes(conn, cursor, indexes, load_failed):
+    """
+    Recreate the dropped indexes and ANALYZE. If the load already failed,
+    a rebuild error is reported instead of raised so it does not mask the
+    original exception.
+    """
+    index_defs = [index_def for _, index_def in indexes]
+
+    if conn.closed != 0:
+        print(
+            "Connection lost; recreate these indexes manually:",
+            *index_defs,
+            sep="\n",
+            file=sys.stderr
+        )
+        return
+
+    try:
+        for index_def in index_defs:
+            cursor.execute(index_def + ";")
+        cursor.execute("ANALYZE fundamental_data;")
+        conn.commit()
+    except psycopg2.Error as exc:
+        if not load_failed:
+            raise
+        if conn.closed == 0:
+            conn.rollback()
+        print(
+            f"Rebuilding indexes failed: {exc}".rstrip(),
+            "Recreate these indexes manually:",
+            *index_defs,
+            sep="\n",
+            file=sys.stderr
+        )
 
-        filepath = os.path.join(DATA_FOLDER, filename)
-        rows = process_file(filepath, mapping)
-        batch.extend(rows)
 
-        if len(batch) > 50000:
-            insert_fundamental_data(batch)
-            batch = []
+# ---------------------------------------------------------
+# MAIN EXECUTION
+# ---------------------------------------------------------
+def main():
+    print("Importing data...")
+    batch = []
+    batch_rows = 0
+
+    # Opened here rather than at import so pool workers, which import this
+    # module under spawn/forkserver, never connect or inherit the socket.
+    conn = psycopg2.connect(
+        host=HOST,
+        database=DATABASE,
+        user=USER,
+        password=PASSWORD
+    )
+    cursor = conn.cursor()
 
-    insert_fundamental_data(batch)
+    try:
+        # Parsing fans out across cores; inserts stay on this connection and
+        # all batches share one transaction, committed when `conn` exits.
+        with (
+            deferred_secondary_indexes(conn, cursor),
+            conn,
+            ProcessPoolExecutor(max_workers=os.cpu_count()) as executor,
+        ):
+            # Skip waiting for the WAL flush on commit; a crash only means
+            # re-running the (idempotent) import.
+            cursor.execute("SET LOCAL synchronous_commit = off;")
+
+            for ticker, columns in parse_files(executor, iter_data_files()):
+                if not columns[0]:
+                    continue
+
+                batch.append((ticker, columns))
+                batch_rows += len(columns[0])
+
+                if batch_rows > BATCH_SIZE:
+                    insert_fundamental_data(cursor, batch)
+                    batch = []
+                    batch_rows = 0
+
+            insert_fundamental_data(cursor, batch)
+    finally:
+        conn.close()
 
     print("Completed successfully!")
 
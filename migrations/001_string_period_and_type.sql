@@ -0,0 +1,43 @@
+-- Brings a database created from the original table_create.sql up to the
+-- schema the importer and API expect:
+--   * fundamental_data_type gets UNIQUE (type, name), the conflict target
+--     the importer uses to register metric names
+--   * period / type become VARCHAR columns with CHECK constraints instead
+--     of the period_type / financial_statement_type ENUMs
+-- Run once, before 002_denormalize_data_type.sql.
+
+BEGIN;
+
+-- 1. fundamental_data_type
+ALTER TABLE fundamental_data_type
+    ALTER COLUMN type TYPE VARCHAR(30) USING type::text;
+
+ALTER TABLE fundamental_data_type
+    ADD CONSTRAINT fundamental_data_type_type_check
+        CHECK (type IN (
+            'per_share_data_array',
+            'common_size_ratios',
+            'income_statement',
+            'balance_sheet',
+            'cashflow_statement',
+            'valuation_ratios',
+            'valuation_and_quality',
+            'other'
+        ));
+
+ALTER TABLE fundamental_data_type
+    ADD CONSTRAINT fundamental_data_type_unique UNIQUE (type, name);
+
+-- 2. fundamental_data (indexes on period are rebuilt by ALTER ... TYPE)
+ALTER TABLE fundamental_data
+    ALTER COLUMN period TYPE VARCHAR(10) USING period::text;
+
+ALTER TABLE fundamental_data
+    ADD CONSTRAINT fundamental_data_period_check
+        CHECK (period IN ('annuals', 'quarterly'));
+
+-- 3. ENUM types are no longer referenced
+DROP TYPE period_type;
+DROP TYPE financial_statement_type;
+
+COMMIT;
@@ -0,0 +1,35 @@
+-- Copies the statement type and metric name from fundamental_data_type
+-- onto fundamental_data so ticker reads need no join, and replaces the
+-- old ticker indexes with the covering one from table_create.sql.
+-- Run after 001_string_period_and_type.sql.
+
+BEGIN;
+
+-- 1. Add the denormalized columns
+ALTER TABLE fundamental_data
+    ADD COLUMN type VARCHAR(30),
+    ADD COLUMN metric_name VARCHAR(50);
+
+-- 2. Backfill from fundamental_data_type
+UPDATE fundamental_data d
+SET type = t.type,
+    metric_name = t.name
+FROM fundamental_data_type t
+WHERE t.id = d.fundamental_data_type_id;
+
+ALTER TABLE fundamental_data
+    ALTER COLUMN type SET NOT NULL,
+    ALTER COLUMN metric_name SET NOT NULL;
+
+-- 3. Rebuild the ticker index as a covering index
+DROP INDEX IF EXISTS idx_fundamental_data_ticker;
+DROP INDEX IF EXISTS idx_fundamental_data_ticker_period_year;
+DROP INDEX IF EXISTS idx_fundamental_data_ticker_period_year_month;
+
+CREATE INDEX idx_fundamental_data_ticker_period_year_month
+    ON fundamental_data (ticker, period, year, month)
+    INCLUDE (id, fundamental_data_type_id, type, metric_name, value);
+
+COMMIT;
+
+ANALYZE fundamental_data;
@@ -1,19 +1,19 @@
--- 1. Create ENUM type for period_type
-CREATE TYPE period_type AS ENUM (
-    'annuals',
-    'quarterly'
-);
-
--- 2. Create table with ON DELETE CASCADE
+-- 1. Create table with ON DELETE CASCADE
+-- period is a plain string checked against the allowed values (was the
+-- period_type ENUM) so clients compare strings without enum coercion.
 CREATE TABLE fundamental_data (
     id BIGSERIAL PRIMARY KEY NOT NULL,
     ticker VARCHAR(30) NOT NULL,
-    period period_type NOT NULL,
+    period VARCHAR(10) NOT NULL
+        CHECK (period IN ('annuals', 'quarterly')),
     year VARCHAR(5) NOT NULL,
     month VARCHAR(3) NOT NULL,
     fundamental_data_type_id BIGINT NOT NULL
         REFERENCES fundamental_data_type(id)
         ON DELETE CASCADE,
+    -- Copied from fundamental_data_type so ticker reads need no join
+    type VARCHAR(30) NOT NULL,
+    metric_name VARCHAR(50) NOT NULL,
     value NUMERIC NOT NULL,
 
     -- Unique constraint to prevent duplicates
@@ -26,35 +26,39 @@ CREATE TABLE fundamental_data (
     )
 );
 
--- 3. Indexes
--- Fast lookup by ticker
-CREATE INDEX idx_fundamental_data_ticker
-    ON fundamental_data (ticker);
-
--- Fast lookup by ticker + time period (common financial queries)
-CREATE INDEX idx_fundamental_data_ticker_period_year
-    ON fundamental_data (ticker, period, year);
+-- 2. Indexes
+-- Fast lookup by ticker + time period (common financial queries).
+-- Covers the ticker-only lookup as a prefix, and the INCLUDE columns
+-- let both the availability and ticker data queries run as index-only
+-- scans.
+CREATE INDEX idx_fundamental_data_ticker_period_year_month
+    ON fundamental_data (ticker, period, year, month)
+    INCLUDE (id, fundamental_data_type_id, type, metric_name, value);
 
 -- Improve join performance on FK
 CREATE INDEX idx_fundamental_data_type_id
     ON fundamental_data (fundamental_data_type_id);
 
 
--- 1. Create ENUM type
-CREATE TYPE financial_statement_type AS ENUM (
-    'per_share_data_array',
-    'common_size_ratios',
-    'income_statement',
-    'balance_sheet',
-    'cashflow_statement',
-    'valuation_ratios',
-    'valuation_and_quality',
-    'other'
-);
-
--- 2. Create table
+-- 1. Create table
+-- type is a plain string checked against the allowed statement types
+-- (was the financial_statement_type ENUM).
 CREATE TABLE fundamental_data_type (
     id BIGSERIAL PRIMARY KEY NOT NULL,
-    type financial_statement_type NOT NULL,
-    name VARCHAR(50) NOT NULL
+    type VARCHAR(30) NOT NULL
+        CHECK (type IN (
+            'per_share_data_array',
+            'common_size_ratios',
+            'income_statement',
+            'balance_sheet',
+            'cashflow_statement',
+            'valuation_ratios',
+            'valuation_and_quality',
+            'other'
+        )),
+    name VARCHAR(50) NOT NULL,
+
+    -- Lets the importer register metric names with ON CONFLICT DO NOTHING;
+    -- also serves (type, name) lookups
+    CONSTRAINT fundamental_data_type_unique UNIQUE (type, name)
 );
\ No newline at end of file